@@ -6,7 +6,6 @@ from tkinter import (Toplevel, Frame, Button, Label, IntVar, Radiobutton)
 from widgets import (TextWithPlaceholder)
 from phylonetwork import MalformedNewickException
 from network_processing import InvalidLeaves
-import drspr as d
 
 class MultiChoicePrompt(Toplevel):
     """Class that creates a multiple choice prompt window for selecting leaves."""
@@ -68,9 +67,10 @@ class MultiChoicePrompt(Toplevel):
         
         self.error_message_frame = Frame(self)
         self.error_message_frame.pack(anchor="c", fill="x")
+        self.error_label = Label(self.error_message_frame, text="", fg="red")
 
-        ok_button = Button(self, text="OK", width=20, command=self._get_input_leaves)
-        ok_button.pack(pady=(20, 20))
+        self.ok_button = Button(self, text="OK", width=20, command=self._get_input_leaves)
+        self.ok_button.pack(pady=(20, 20))
         
     def _text_focus_off(self, *_):
         """Removes focus from the TextWithPlaceholder object."""
@@ -94,23 +94,25 @@ class MultiChoicePrompt(Toplevel):
                 raise InvalidLeaves
             
             self.main.network.set_current_selected_leaves(input_leaves)
-            self.main.generate_trees_graph()
-            self._exit()
+            
+            #Prevent leaves being submitted again until trees are generated
+            self.ok_button.config(state="disabled")
+            self.main.generate_trees_graph(on_success=self._on_trees_generated)
             
         except InvalidLeaves as e:
             #Display error message
-            error_message = Label(self.error_message_frame, text=e, fg="red")
-            error_message.pack(pady=(10, 10), padx=20)
+            self.error_label.configure(text=e)
+            self.error_label.pack(pady=(10, 10), padx=20)
             
+    def _on_trees_generated(self):
+        """Close dialog once trees have been generated"""
+        self.ok_button.config(state="normal")
+        self._exit()
+        
     def _clear_error_messages(self):
         """Clear any error messages in dialog"""
-        for widget in self.error_message_frame.winfo_children():
-            widget.destroy()
-        
-        empty_frame = Frame(self.error_message_frame)
-        empty_frame.pack()
-        
-        self.error_message_frame.update()
+        self.error_label.configure(text="")
+        self.error_label.pack_forget()
             
     def _exit(self):
         """Hide window"""
@@ -160,17 +162,19 @@ class StringInputPrompt(Toplevel):
         
         self.error_message_frame = Frame(self)
         self.error_message_frame.pack(anchor="c", pady=(0,20))
+        self.error_label = Label(self.error_message_frame, text="", fg="red")
         
         self.buttons_frame = Frame(self)
         self.buttons_frame.pack(side="bottom", anchor="c", pady=(10, 20))
-        ok_button = Button(self.buttons_frame, text="OK", width=20, command=self._get_input)
+        self.ok_button = Button(self.buttons_frame, text="OK", width=20, command=self._get_input)
         cancel_button = Button(self.buttons_frame, text="Cancel", width=20, command=self._exit)
-        ok_button.pack(side="left", padx=(20,10))
+        self.ok_button.pack(side="left", padx=(20,10))
         cancel_button.pack(side="right", padx=(10,20))
         
     def change_contents(self, title, prompt, placeholder=""):
         """
-        Change title, prompt and placeholder text of this dialog
+        Change title, prompt and placeholder text of this dialog. The existing widgets are updated in place
+        rather than being destroyed and created again, so the dialog can be reused for each operation.
         
         Parameters
         ----------
@@ -191,83 +195,89 @@ class StringInputPrompt(Toplevel):
         
         
     def _get_input(self):
-        """Get network/trees entered"""
+        """Get network/trees entered. Input is processed in the background by the main window."""
         self._clear_error_messages()
         
         input_text = self.text_entry.get("1.0", "end").strip()
         
-        try:
-            if input_text == self.placeholder:
-                raise MalformedNewickException
+        if input_text == self.placeholder:
+            self._show_input_error(MalformedNewickException(), input_text)
+            return
+        
+        if self.operation == "Network":
+            process_input = self.main.generate_network
+        elif self.operation == "Calculate drSPR":
+            process_input = self.main.get_drspr
+        else:
+            process_input = self.main.get_rspr_graph
+        
+        #Prevent input being submitted again until processing finished
+        self.ok_button.config(state="disabled")
+        process_input(input_text, on_success=self._on_input_processed,
+                      on_error=lambda e: self._show_input_error(e, input_text))
+        
+    def _on_input_processed(self):
+        """Close dialog once input has been processed"""
+        self.ok_button.config(state="normal")
+        self._exit()
+        
+    def _show_input_error(self, error, input_text):
+        """
+        Display error messages for input that couldn't be processed
+        
+        Parameters
+        ----------
+        error : Exception
+            Exception raised when processing input
             
-            if self.operation == "Network":
-                self.main.generate_network(input_text)
-            elif self.operation == "Calculate drSPR":
-                self.main.get_drspr(input_text)
-            else:
-                self.main.get_rspr_graph(input_text)
-                
-            self._exit()
+        input_text : str
+            Network/trees entered
+        """
+        self.ok_button.config(state="normal")
         
+        error_messages = []
         
-        except MalformedNewickException:
+        if isinstance(error, MalformedNewickException):
             if not input_text or input_text == self.placeholder:
                 if self.operation == "Network":
-                    error_text = "Please enter network"
+                    error_messages.append("Please enter network")
                 else:
-                    error_text = "Please enter at least 2 trees"
-                    
-                Label(self.error_message_frame,
-                      text=error_text, fg="red").pack(anchor="c")
-                return
-            
-            #Check the input
-            if input_text[-1] != ";":
-                Label(self.error_message_frame,
-                      text="String not terminated by semicolon",
-                      fg="red").pack(anchor="c")
-                
-            #Count brackets
-            opening_brackets = 0
-            closing_brackets = 0
+                    error_messages.append("Please enter at least 2 trees")
             
-            for character in input_text:
-                if character == "(":
-                    opening_brackets += 1
-                elif character == ")":
-                    closing_brackets += 1
+            else:
+                #Check the input
+                if input_text[-1] != ";":
+                    error_messages.append("String not terminated by semicolon")
+                    
+                #Count brackets
+                opening_brackets = input_text.count("(")
+                closing_brackets = input_text.count(")")
+    
+                if opening_brackets > closing_brackets:
+                    error_messages.append(f"Missing {opening_brackets - closing_brackets} closing bracket(s)")
+                    
+                elif closing_brackets > opening_brackets:
+                    error_messages.append(f"Missing {closing_brackets - opening_brackets} closing bracket(s)")
                     
-            if opening_brackets > closing_brackets:
-                Label(self.error_message_frame,
-                      text=f"Missing {opening_brackets - closing_brackets} closing bracket(s)",
-                      fg="red").pack(anchor="c")
-                
-            elif closing_brackets > opening_brackets:
-                Label(self.error_message_frame,
-                      text=f"Missing {closing_brackets - opening_brackets} closing bracket(s)",
-                      fg="red").pack(anchor="c")
-                
-            elif opening_brackets == 0 or closing_brackets == 0:
-                Label(self.error_message_frame,
-                      text="Missing brackets", fg="red").pack(anchor="c")
-        
-        
-        except InvalidLeaves:
+                elif opening_brackets == 0 or closing_brackets == 0:
+                    error_messages.append("Missing brackets")
+        
+        elif isinstance(error, InvalidLeaves):
             #No labelled leaves in the input
-            Label(self.error_message_frame,
-                  text="Must have at least one labelled leaf",
-                  fg="red").pack(anchor="c")
+            error_messages.append("Must have at least one labelled leaf")
+            
+        else:
+            raise error
+        
+        if error_messages:
+            self.error_label.configure(text="\n".join(error_messages))
+            self.error_label.pack(anchor="c")
             
         
     def _clear_error_messages(self):
         """Clear any error messages in dialog"""
-        for widget in self.error_message_frame.winfo_children():
-            widget.destroy()
-        
-        empty_frame = Frame(self.error_message_frame)
-        empty_frame.pack()
-        
-        self.error_message_frame.update()
+        self.error_label.configure(text="")
+        self.error_label.pack_forget()
         
     def _exit(self):
         """Hide window"""
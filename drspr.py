@@ -5,13 +5,29 @@ Source code for rspr executable:
 https://github.com/cwhidden/rspr
 """
 
-import platform, sys, os, subprocess
+import platform, sys, os, subprocess, math, re, threading
 from subprocess import PIPE, Popen
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import combinations_with_replacement
 from phylonetwork import MalformedNewickException, PhylogeneticNetwork
-import network_processing as np
-import matplotlib.pyplot as plt
+from cached_property import cached_property
 import path
 
+_IS_WINDOWS = platform.system() == "Windows"
+
+#Location of rspr executable, resolved once
+_RSPR_PATH = path.resource_path("rspr.exe" if _IS_WINDOWS else "rspr")
+
+#Result given to a pair of trees that rspr did not return a distance for
+RSPR_ERROR = ("X", ["Error occured in rspr. No distance calculated for this pair of trees."])
+
+#Last 3 lines of a pair's rspr output: the first forest, the second forest and the distance
+_RSPR_RESULT = re.compile(r"^(F1: .*)\n.*\n.*=[ \t]*(\S+)\s*\Z", re.MULTILINE)
+
+#Label and optional branch length of a node in a plain newick string, matching the characters
+#and numbers accepted by phylonetwork's eNewick parser
+_NEWICK_LABEL = re.compile(r"""([A-Za-z0-9_\-.+&/~{}*'"\\?]*)(?::([+-]?[0-9]+(?:\.[0-9]*)?(?:[eE][+-]?[0-9]+)?))?""")
+
 
 def rspr(tree1, tree2):
     """
@@ -26,50 +42,192 @@ def rspr(tree1, tree2):
         
     Returns
     -------
-    tuple[list[str], list[str]]
-        Tuple of array of distances and array of clusters
+    tuple[str, list[str]]
+        Tuple of distance and array of clusters. Distance is "X" if rspr gave no result.
     """
-    input_string = tree1 + "\n" + tree2
+    return rspr_parallel([(tree1, tree2)])[0]
+
+
+def rspr_batch(pairs):
+    """
+    Runs the external rspr executable once for a list of tree pairs. The executable reads
+    the trees from stdin two lines at a time, so every pair is written in a single input
+    stream and the output is split back into one result per pair.
     
-    if platform.system() == "Windows":
-        file = path.resource_path("rspr.exe")
-        executable = Popen(executable=file, args="", stdin=PIPE,
-                               stdout=PIPE, stderr=PIPE,
-                               universal_newlines=True, shell=True)
-        
-        out, err = executable.communicate(input=input_string) 
-        
-        executable.wait()
-        executable.kill()
-        
-    else:
-        file = path.resource_path("rspr")
-        file = file.replace(" ", "\ ")
-        executable = subprocess.run(file, stdout=PIPE, stderr=PIPE,
-                                    input=input_string.encode("utf-8"),
-                                    shell=True)
+    Parameters
+    ----------
+    pairs : list[tuple[str, str]]
+        Array of pairs of trees in newick format
         
-        out = executable.stdout.decode("utf-8")
-        err = executable.stderr.decode("utf-8")
+    Returns
+    -------
+    list[tuple[str, list[str]]]
+        Array of (distance, clusters) tuples in the same order as pairs
+    """
+    if not pairs:
+        return []
     
-    out = out.strip()
-    output_list = out.split("\n")
+    input_string = "\n".join(f"{tree1}\n{tree2}" for tree1, tree2 in pairs)
+    
+    try:
+        if _IS_WINDOWS:
+            #communicate waits for rspr to exit, the context manager closes the pipes
+            with Popen([_RSPR_PATH], stdin=PIPE, stdout=PIPE, stderr=PIPE,
+                       universal_newlines=True) as executable:
+                out, err = executable.communicate(input=input_string) 
+            
+        else:
+            executable = subprocess.run([_RSPR_PATH], stdout=PIPE, stderr=PIPE,
+                                        input=input_string.encode("utf-8"),
+                                        check=False)
+            
+            out = executable.stdout.decode("utf-8")
+            err = executable.stderr.decode("utf-8")
+            
+    except OSError as e:
+        #Executable could not be run
+        out = ""
+        err = str(e)
     
     if err:
         print(err)
         print("Error occured in rspr")
     
-    length = len(output_list)
+    return parse_rspr_output(out, len(pairs))
+
+
+def parse_rspr_output(out, num_pairs):
+    """
+    Splits the output of a batched rspr run into the result of each pair of trees. Pairs
+    without a complete result (e.g. rspr failed or stopped partway through the batch) are
+    given an error result so every pair is accounted for.
+    
+    Parameters
+    ----------
+    out : str
+        Standard output of rspr
+        
+    num_pairs : int
+        Number of pairs of trees given to rspr
+        
+    Returns
+    -------
+    list[tuple[str, list[str]]]
+        Array of (distance, clusters) tuples in the same order as the pairs given to rspr
+    """
+    #Output of each pair starts with the "T1: " line echoing the first tree.
+    #Only the last 3 lines of each pair's output are needed
+    outputs = f"\n{out}".split("\nT1: ")[1:num_pairs + 1]
+    
+    results = []
+    for output in outputs:
+        match = _RSPR_RESULT.search(output)
+        
+        if match is None:
+            results.append(RSPR_ERROR)
+            continue
+        
+        forest, distance = match.groups()
+        clusters = forest.split()[2:]
+        results.append((distance, clusters))
+    
+    #No output for the remaining pairs
+    results.extend([RSPR_ERROR] * (num_pairs - len(results)))
+    
+    return results
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+#Chunks of pairs queued per worker thread. rspr's running time varies a lot between pairs, so
+#smaller chunks stop one slow chunk from leaving the other workers idle
+_CHUNKS_PER_WORKER = 4
+
+#Results of rspr for each (tree1, tree2) pair of newick strings calculated this session. Pairs
+#are ordered since the clusters come from the first tree's forest
+_rspr_cache = {}
+
+def _get_executor():
+    """
+    For private use. Thread pool shared by every rspr_parallel call so worker threads are only
+    started once per session.
+    
+    Returns
+    -------
+    ThreadPoolExecutor
+        Pool with one worker per CPU core
+    """
+    global _executor
+    
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="rspr")
+            
+    return _executor
+
+
+def rspr_parallel(pairs):
+    """
+    Runs rspr on the pairs that haven't already been calculated this session. Pairs are
+    split into chunks that run at the same time in the shared thread pool. Threads are enough since the work is done by the external rspr processes.
+    
+    Parameters
+    ----------
+    pairs : list[tuple[str, str]]
+        Array of pairs of trees in newick format
+        
+    Returns
+    -------
+    list[tuple[str, list[str]]]
+        Array of (distance, clusters) tuples in the same order as pairs
+    """
+    #Each distinct pair not in the cache is only calculated once
+    new_pairs = list(dict.fromkeys(pair for pair in pairs if pair not in _rspr_cache))
+    new_results = dict(zip(new_pairs, _rspr_chunks(new_pairs)))
+    
+    for pair, result in new_results.items():
+        if result is not RSPR_ERROR:
+            _rspr_cache[pair] = result
+    
+    return [new_results[pair] if pair in new_results else _rspr_cache[pair] for pair in pairs]
+
 
-    forest = output_list[length - 3]
-    distance = output_list[-1].split()
-    distance = distance[-1]
-    equals_index = distance.index("=")
-    distance = distance[equals_index+1:]
+def _rspr_chunks(pairs):
+    """
+    For private use. Splits the tree pairs into a few chunks per CPU core and runs rspr on
+    the chunks at the same time.
+    
+    Parameters
+    ----------
+    pairs : list[tuple[str, str]]
+        Array of pairs of trees in newick format
+        
+    Returns
+    -------
+    list[tuple[str, list[str]]]
+        Array of (distance, clusters) tuples in the same order as pairs
+    """
+    num_workers = min(os.cpu_count() or 1, len(pairs))
+    
+    if num_workers <= 1:
+        return rspr_batch(pairs)
+    
+    chunk_size = math.ceil(len(pairs) / (num_workers * _CHUNKS_PER_WORKER))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    chunk_results = [None] * len(chunks)
+    pairs_done = 0
+    
+    executor = _get_executor()
+    futures = {executor.submit(rspr_batch, chunk): i for i, chunk in enumerate(chunks)}
     
-    clusters = forest.split()[2:]
+    for future in as_completed(futures):
+        i = futures[future]
+        chunk_results[i] = future.result()
+        pairs_done += len(chunks[i])
+        print(f'\r {round(pairs_done / len(pairs) * 100)}% complete: Calculated distances for {pairs_done} / {len(pairs)} pairs', end="\r", flush=True)
     
-    return (distance, clusters)
+    return [result for results in chunk_results for result in results]
 
 
 def rspr_pairwise(trees):
@@ -86,11 +244,6 @@ def rspr_pairwise(trees):
     tuple(list[str], list[str], list[Tree])
         Tuple of distance array, clusters array and trees array
     """
-    #Calculating total number of comparisons
-    num_comparisons = 0
-    for i in range(len(trees) + 1):
-        num_comparisons += i
-    
     print("\nPerforming pairwise distance calculation...")
     length = len(trees)
     
@@ -100,46 +253,70 @@ def rspr_pairwise(trees):
     for i, tree_string in enumerate(trees):
         trees_array[i] = f"t{i+1}:\n{tree_string};\n{tree_error_text}\n"
     
-    distance_array = [["-" for i in range(length)] for j in range(length)]
-    clusters_array = [["-" for i in range(length)] for j in range(length)]
+    distance_array = [["-"] * length for _ in range(length)]
+    clusters_array = [["-"] * length for _ in range(length)]
     
-    compare_count = 1
+    #Pairs of trees with the same leaf set and their position in the matrix
+    pairs = []
+    pair_indices = []
     
-    file = path.resource_path("rspr.exe")
-    print(f" Opening file at {file}")
+    print(f" Opening file at {_RSPR_PATH}")
     
-    for i in range(len(trees)):
-        for j in range(i, len(trees)):
-            try:
-                
-                compare_count += 1
-                t1 = Tree(trees[i] + ";", f"t{i+1}")
-                t2 = Tree(trees[j] + ";", f"t{j+1}")
-                trees_array[i] = t1
-                
-                #Check if leaf set the same
-                t1_leaves = t1.labelled_leaves 
-                t2_leaves = t2.labelled_leaves
-                
-                if t1.has_unlabelled_leaf() or t2.has_unlabelled_leaf():
-                    distance_array[i][j] = "X"
-                    clusters_array[i][j] = ["Error occured. Tree(s) contain unlabelled leaves. Make sure all leaves are labelled."]
-
-                elif t1_leaves == t2_leaves:
-                    (distance, clusters) = rspr(t1.eNewick(), t2.eNewick())
-                    distance_array[i][j] = distance
-                    clusters_array[i][j] = clusters
-                    
-                else:
-                    missing_leaves = (t1_leaves.difference(t2_leaves)).union(t2_leaves.difference(t1_leaves))
-                    distance_array[i][j] = "X"
-                    clusters_array[i][j] = [f"Error occured. Trees don't have same taxa set. Missing taxa: {', '.join(missing_leaves)}"]
-                
-                print(f'\r {round(compare_count / num_comparisons*100)}% complete: Calculating between t{i+1} and t{j+1}', end="\r", flush=True)
-                
-            except MalformedNewickException:
-                distance_array[i][j] = "X"
-                clusters_array[i][j] = ["Error occured. Check tree newick string."]
+    #Parse each tree once and keep the details needed for every comparison
+    parsed_trees = [None] * length
+    newicks = [None] * length
+    leaf_sets = [None] * length
+    unlabelled = [False] * length
+    
+    for i, tree_string in enumerate(trees):
+        try:
+            tree = Tree(tree_string + ";", f"t{i+1}")
+        except MalformedNewickException:
+            continue
+        
+        trees_array[i] = tree
+        parsed_trees[i] = tree
+        newicks[i] = tree.enewick
+        leaf_sets[i] = tree.labelled_leaves
+        hash(leaf_sets[i]) #Hash is cached so leaf sets of the same size but different leaves compare in O(1)
+        unlabelled[i] = tree.has_unlabelled_leaf()
+    
+    for i, j in combinations_with_replacement(range(length), 2):
+        if parsed_trees[i] is None or parsed_trees[j] is None:
+            distance_array[i][j] = "X"
+            clusters_array[i][j] = ["Error occured. Check tree newick string."]
+            continue
+        
+        #Check if leaf set the same
+        t1_leaves = leaf_sets[i]
+        t2_leaves = leaf_sets[j]
+        
+        if unlabelled[i] or unlabelled[j]:
+            distance_array[i][j] = "X"
+            clusters_array[i][j] = ["Error occured. Tree(s) contain unlabelled leaves. Make sure all leaves are labelled."]
+            
+        elif newicks[i] == newicks[j]:
+            #Tree compared with itself or an identical tree. eNewick strings are canonical so
+            #identical trees written differently are not sent to rspr
+            distance_array[i][j] = "0"
+            clusters_array[i][j] = []
+
+        elif t1_leaves == t2_leaves:
+            #Distance calculated later in a single rspr run
+            pairs.append((newicks[i], newicks[j]))
+            pair_indices.append((i, j))
+            
+        else:
+            missing_leaves = t1_leaves ^ t2_leaves
+            distance_array[i][j] = "X"
+            clusters_array[i][j] = [f"Error occured. Trees don't have same taxa set. Missing taxa: {', '.join(missing_leaves)}"]
+    
+    print(f" Calculating distances between {len(pairs)} pairs of trees...")
+    results = rspr_parallel(pairs)
+    
+    for (i, j), (distance, clusters) in zip(pair_indices, results):
+        distance_array[i][j] = distance
+        clusters_array[i][j] = clusters
 
     print(f'\r 100% complete: pairwise distance calculated for {len(trees)} trees\n')
     return (distance_array, clusters_array, trees_array)
@@ -188,12 +365,11 @@ def calculate_drspr(trees):
                 return(["X"], ["Error occured. Tree(s) contain unlabelled leaves. Make sure all leaves are labelled."], Trees(trees_array))
                 
             elif t1_leaves == t2_leaves:
-                file = path.resource_path("rspr.exe")
-                print(f" Opening file at {file}")
-                (distances, clusters) = rspr(trees_array[0].eNewick(), trees_array[1].eNewick())
+                print(f" Opening file at {_RSPR_PATH}")
+                (distances, clusters) = rspr(trees_array[0].enewick, trees_array[1].enewick)
             
             else:
-                missing_leaves = (t1_leaves.difference(t2_leaves)).union(t2_leaves.difference(t1_leaves))
+                missing_leaves = t1_leaves ^ t2_leaves
                 return (["X"], [f"Error occured. Trees don't have same taxa set. Missing taxa: {', '.join(missing_leaves)}"], Trees(trees_array))
                 
         except AttributeError:
@@ -206,6 +382,61 @@ def calculate_drspr(trees):
     return (distances, clusters, trees_obj)
 
 
+
+def _parse_newick(string):
+    """
+    Parses a plain newick string (labels and branch lengths only, no whitespace) with a single
+    iterative scan.
+    
+    Parameters
+    ----------
+    string : str
+        Tree in newick format terminated by semicolon
+        
+    Returns
+    -------
+    tuple[list[str], list[tuple[int, int, float]]] or None
+        Tuple of node labels in pre-order (None for unlabelled nodes) and edges as (parent, child,
+        length) in the order phylonetwork adds them. None if the string is not plain newick.
+    """
+    labels = []
+    edges = []
+    stack = [] #Internal nodes whose closing bracket hasn't been reached
+    pos = 0
+    
+    while True:
+        #Start of subtree
+        if string.startswith("(", pos):
+            stack.append(len(labels))
+            labels.append(None)
+            pos += 1
+            continue
+        
+        node = len(labels)
+        labels.append(None)
+        
+        #Label the completed subtree then attach it to its parent
+        while True:
+            match = _NEWICK_LABEL.match(string, pos)
+            labels[node] = match.group(1) or None
+            length = match.group(2)
+            length = float(length) if length else None
+            pos = match.end()
+            
+            if not stack:
+                return (labels, edges) if string[pos:] == ";" else None
+            
+            edges.append((stack[-1], node, length))
+            char = string[pos:pos+1]
+            pos += 1
+            
+            if char == ",":
+                break
+            elif char == ")":
+                node = stack.pop()
+            else:
+                return None
+
     
 class Tree(PhylogeneticNetwork):
     """Class for trees involved in drSPR function"""
@@ -222,44 +453,80 @@ class Tree(PhylogeneticNetwork):
         super().__init__(tree)
         self.id = number
         self.text = f"{self.id}:\n{tree}\n"
+        self._unlabelled_leaf = None #Result of has_unlabelled_leaf once checked
+        
+    def _from_eNewick(self, string, ignore_prefix=None):
+        """
+        Builds tree from newick string. Plain newick strings are read with _parse_newick, which
+        is much faster than phylonetwork's parser, and give the same nodes, labels and edges.
+        Any other string is left to phylonetwork's parser.
+        
+        Parameters
+        ----------
+        string : str
+            Tree in newick format
+        """
+        parsed = _parse_newick(string)
+        
+        if parsed is None:
+            super()._from_eNewick(string, ignore_prefix=ignore_prefix)
+            return
+        
+        labels, edges = parsed
+        node_ids = [self._generate_new_id() for _ in labels]
         
-    @property
+        for node_id, label in zip(node_ids, labels):
+            if label is None:
+                self.add_node(node_id)
+            else:
+                self.add_node(node_id, label=label)
+                
+        for parent, child, length in edges:
+            if length is None:
+                self.add_edge(node_ids[parent], node_ids[child])
+            else:
+                self.add_edge(node_ids[parent], node_ids[child], length=length)
+        
+        self.cache = {}
+        
+    @cached_property
+    def enewick(self):
+        """
+        Returns
+        -------
+        str
+            Tree in eNewick format, as given to rspr
+        """
+        return self.eNewick()
+        
+    @cached_property
     def labelled_leaves(self):
         """
         Returns
         -------
-        set(str)
+        frozenset(str)
             Set of labelled leaves in tree
         """
-        leaves = self.leaves
-        labelled_leaves = set()
-        
         labels_dict = self.labeling_dict
-        
-        for leaf in leaves:
-            if leaf in labels_dict:
-                labelled_leaves.add(labels_dict[leaf])
-            
-        return labelled_leaves
+        return frozenset(labels_dict[leaf] for leaf in self.leaves if leaf in labels_dict)
 
     def has_unlabelled_leaf(self):
         """
         Check if tree has unlabelled leaf. rspr program crashes when given an input tree with unlabelled
-        leaves.
+        leaves. The tree is only checked (and the error added to its text) the first time this is called.
         
         Returns
         -------
         bool
             Returns true if tree has unlabelled leaf
         """
-        leaves = self.leaves
-        
-        for leaf in leaves:
-            if not self.is_labeled(leaf):
+        if self._unlabelled_leaf is None:
+            self._unlabelled_leaf = not self.leaves <= self.labeling_dict.keys()
+            
+            if self._unlabelled_leaf:
                 self.text += "Error occured. Tree contains 1 or more unlabelled leaves. Make sure all leaves are labelled.\n"
-                return True
         
-        return False
+        return self._unlabelled_leaf
 
 
 class Trees:
@@ -281,8 +548,9 @@ class Trees:
         Parameters
         ----------
         close_figs : bool
-            Logic to close tree figures that are drawn (default is True). False if you want to use matplotlib's
-            figure interface instead of phyloprogram front end.
+            Logic to draw the trees on figures that aren't managed by pyplot (default is True), so no pyplot window
+            is created and closed for each figure. False if you want to use matplotlib's figure interface instead
+            of phyloprogram front end.
             
         Returns
         -------
@@ -291,6 +559,11 @@ class Trees:
         """
         
         if not self.figures: #If there are no existing figures, draw them
+            #Drawing modules only imported when trees are drawn
+            from matplotlib.figure import Figure
+            import matplotlib.pyplot as plt
+            import network_processing as np
+            
             print("\nDrawing trees...")
             total_trees = len(self.trees)
             #Number of rows and cols per figure
@@ -304,12 +577,11 @@ class Trees:
                 plot_number = i % (rows * cols)
                 if plot_number == 0:
                     
-                    #Close open figures
+                    #Create new figure. Figures for phyloprogram are embedded in its own canvases
                     if close_figs:
-                        plt.close("all")
-                    
-                    #Create new figure
-                    figure = plt.figure()
+                        figure = Figure()
+                    else:
+                        figure = plt.figure()
                     
                     #Add new figure
                     self.figures.append(figure)
@@ -371,6 +643,7 @@ if __name__ == "__main__":
             
     #Draw trees
     #Requires Graphviz
+    import matplotlib.pyplot as plt
     figures = trees_obj.draw(False)
     plt.show()
     
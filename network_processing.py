@@ -3,8 +3,9 @@ Module that handles the generation of trees displayed by input network
 """
 
 from phylonetwork import PhylogeneticNetwork
-import matplotlib.pyplot as plt
-import copy, math
+import networkx as nx
+from networkx.drawing.nx_agraph import graphviz_layout
+import itertools, math
 
 from cached_property import cached_property
 from typing import List
@@ -22,8 +23,6 @@ def create_graph(graph, ax):
     ax : Figure axes
         Axes that graph will be drawn on
     """
-    import networkx as nx
-    from networkx.drawing.nx_agraph import graphviz_layout
     pos = graphviz_layout(graph, prog="dot")
     nx.draw_networkx_nodes(graph, pos, graph.tree_nodes, node_size=200, node_color="#57f542", ax=ax)
     nx.draw_networkx_nodes(graph, pos, graph.reticulations, node_size=150, node_shape="s", node_color="#57f542", ax=ax)
@@ -66,7 +65,7 @@ class Network:
         self.trees_dict = {} #Dictionary that stores the selected leaves and corresponding generated Trees object
 
         
-    @property
+    @cached_property
     def num_reticulations(self):
         """
         Number of reticulations in input network
@@ -91,27 +90,31 @@ class Network:
         return len(self.labelled_leaves)
         
 
-    @property
+    @cached_property
     def labelled_leaves(self):
         """
-        Labelled leaves of the input network.
+        Labelled leaves of the input network. Calculated once since the input network isn't changed.
         
         Returns
         -------
-        list[str]
+        tuple[str]
             Array of labelled leaves
         """
         #Get all labelled leaves from input network
-        labelled_leaves = []
-        leaves = list(self._original_network.leaves)
+        labels_dict = self._original_network.labeling_dict
+        return tuple(sorted(labels_dict[leaf] for leaf in self._original_network.leaves if leaf in labels_dict))
+    
+    @cached_property
+    def _labelled_leaves_set(self):
+        """
+        For private use. Set of the labelled leaves of the input network for fast membership tests.
         
-        for net_leaf in leaves:
-            label = self._original_network.label(net_leaf)
-            if label != None:
-                labelled_leaves.append(label)
-                
-        labelled_leaves.sort()
-        return labelled_leaves
+        Returns
+        -------
+        frozenset[str]
+            Set of labelled leaves
+        """
+        return frozenset(self.labelled_leaves)
         
     
     @property
@@ -168,24 +171,16 @@ class Network:
             Leaves delimited by commas from user input
         """
         if isinstance(selected_leaves, str):
-            leaves = [x.strip() for x in selected_leaves.split(",")]
-            leaves.sort()
-            selected_leaves = tuple(leaves)
+            #Delete invalid and repeated leaves
+            valid_leaves = self._labelled_leaves_set.intersection(x.strip() for x in selected_leaves.split(","))
         else:
-            selected_leaves = tuple(self.labelled_leaves)
-        
-        #Delete invalid leaves
-        valid_leaves = []    
-        
-        for leaf in selected_leaves:
-            if leaf in self.labelled_leaves:
-                valid_leaves.append(leaf)
+            valid_leaves = self._labelled_leaves_set
             
         if not valid_leaves:
             raise InvalidLeaves()
         else:
-            valid_leaves.sort()
-            self.current_selected_leaves = tuple(valid_leaves)
+            #Sorted so the same leaves given in any order share the same generated trees
+            self.current_selected_leaves = tuple(sorted(valid_leaves))
     
     @property
     def total_trees(self):
@@ -197,37 +192,45 @@ class Network:
         int
             Number of total trees
         """
-        return len(self.all_trees)
-            
+        #One tree per choice of removed parent edge for every reticulation
+        return math.prod(len(parents) for parents in self._reticulation_parents)
+    
     @cached_property
-    def all_trees(self):
+    def _reticulation_parents(self):
         """
-        Part of initialisation process. Get all 2^r unsuppressed trees
+        For private use. Parents of each reticulation in the current network, which isn't changed
+        when trees are made from it.
         
         Returns
-        tuple[PhylogeneticNetwork]
-            Array of unsuppressed trees
+        -------
+        tuple[tuple[str]]
+            Parent nodes of each reticulation, in the same order as the reticulations
         """
-        #Get number of reticulations
-        number_reticulations = len(self._current_reticulations)
-        
-        #Creating trees
-        prev_networks = [self._current_network]
-
-        #Removing one edge per reticulation
-        for i in range(number_reticulations):
-            new_networks = []
-            reticulation = self._current_reticulations[i]
+        return tuple(tuple(self._current_network.predecessors(reticulation)) for reticulation in self._current_reticulations)
             
-            for parent in self._current_network.predecessors(reticulation):
-                for prev_net in prev_networks:
-                    new_net = copy.deepcopy(prev_net)
-                    new_net.remove_edge(parent, reticulation)
-                    new_networks.append(new_net)
-                    
-            prev_networks = copy.deepcopy(new_networks)
+    def iter_all_trees(self):
+        """
+        Get all 2^r unsuppressed trees. Trees are made one at a time as they are needed, so
+        each tree can be changed by the caller and only one is held in memory at a time.
+        
+        Yields
+        ------
+        PhylogeneticNetwork
+            Unsuppressed tree
+        """
+        #Last reticulation first so it changes slowest
+        reticulations = self._current_reticulations[::-1]
+        parents = self._reticulation_parents[::-1]
         
-        return tuple(prev_networks) #array of PhylogeneticNetwork objects
+        #Each tree removes the edge from one parent of every reticulation, so it is made with a
+        #single copy of the current network
+        for removed_parents in itertools.product(*parents):
+            tree = self._current_network.copy()
+            
+            for reticulation, parent in zip(reticulations, removed_parents):
+                tree.remove_edge(parent, reticulation)
+                
+            yield tree
         
     
     def process(self):
@@ -253,15 +256,12 @@ class Network:
     def retain_labelled_leaves(self):
         """Modify the current network to remove labels of nodes not specified in leaves argument"""
         
-        labels_to_remove = []
-        labelled_nodes = self._original_network.labeled_nodes
+        #Labels of internal nodes
+        labels_to_remove = self._original_network.taxa - self._labelled_leaves_set
+        
+        if not labels_to_remove: #Only leaves are labelled so there is nothing to remove
+            return
         
-        for node in labelled_nodes:
-            label = self._original_network.label(node)
-            
-            if label not in self.labelled_leaves:
-                labels_to_remove.append(label)
-                
         self._current_network.remove_taxa(labels_to_remove)
 
 
@@ -273,6 +273,24 @@ class InvalidLeaves(Exception):
         super().__init__(self.message)
     
     
+class TreeEntry:
+    """Distinct tree generated from a network and the number of times it occurs"""
+    __slots__ = ("count", "tree")
+    
+    def __init__(self, tree, count=1):
+        """
+        Parameters
+        ----------
+        tree : PhylogeneticNetwork
+            First generated tree with this newick, which is the one drawn
+            
+        count : int
+            Number of generated trees with this newick (default is 1)
+        """
+        self.tree = tree
+        self.count = count
+    
+    
 class EmbeddedTrees:
     """
     Class that handles the generation of displayed trees from network.
@@ -287,11 +305,12 @@ class EmbeddedTrees:
         leaves : tuple[str]
             Selected leaves that will be retained when trees are suppressed
         """
-        self.trees_data = {} #Dictionary of unique tree newicks with count
+        self.trees_data = {} #Dictionary of unique tree newicks with their TreeEntry
         self.tree_figs = []
         self.network = network
         self._selected_leaves = leaves
-        self.total_trees = int(math.pow(2, self.network.num_reticulations))
+        self._selected_leaves_set = frozenset(leaves) #For fast membership tests when trees are pruned
+        self.total_trees = self.network.total_trees
         
     @property
     def num_unique_trees(self):
@@ -313,9 +332,9 @@ class EmbeddedTrees:
         
         Returns
         -------
-        dict[str, list[int, PhylogeneticNetwork]]
-            Key is tree newick, Value is array with number of occurences in first index and the
-            PhylogeneticNetwork object of tree in second index
+        dict[str, TreeEntry]
+            Key is tree newick, Value has the number of occurences and the PhylogeneticNetwork
+            object of the tree
         """
         return self.trees_data
         
@@ -356,37 +375,43 @@ class EmbeddedTrees:
         """
         contents = f"\n\nTREES\nLeaves:\n{', '.join(self._selected_leaves)}\n\nTotal trees: {self.network.total_trees}\nDistinct trees: {self.num_unique_trees}\n\n"
         
-        for tree, data in self.trees_data.items():
-            contents += f"{tree}  x{data[0]}\n"
+        for tree, entry in self.trees_data.items():
+            contents += f"{tree}  x{entry.count}\n"
             
         return contents
     
     def generate(self):
         """Get and plot all unique trees displayed by the given network with the number of occurence displayed above the plot."""
-        unique_tree_newicks = set()
-        
         print("\nGenerating embedded trees...")
         
-        for i, unsuppressed_tree in enumerate(self.network.all_trees, start=1):
-            tree = PhylogeneticNetwork(unsuppressed_tree.eNewick())
-            
+        #eNewick strings of the reduced trees by their edges. Every tree is a copy of the same network
+        #so trees with the same edges (and branch lengths) are the same tree
+        newicks_by_edges = {}
+        
+        for i, tree in enumerate(self.network.iter_all_trees(), start=1):
             #Reduce tree
             tree.remove_elementary_nodes()
 
             self.remove_unselected_leaves(tree)
             self.remove_dummy_leaves(tree)
             
-            tree_newick = tree.eNewick()
+            edges = frozenset(tree.edges(data="length"))
+            tree_newick = newicks_by_edges.get(edges)
             
-            #Check if tree is unique
-            if tree_newick in unique_tree_newicks:
-                self.trees_data[tree_newick][0] += 1
+            if tree_newick is None:
+                tree_newick = tree.eNewick()
+                
+                if edges: #Trees without edges are a single node, which the edges don't identify
+                    newicks_by_edges[edges] = tree_newick
+            
+            #Check if tree is unique. Only the first tree of each distinct tree is kept
+            entry = self.trees_data.get(tree_newick)
+            
+            if entry is None:
+                self.trees_data[tree_newick] = TreeEntry(tree)
+            else:
+                entry.count += 1
             
-            elif tree_newick not in unique_tree_newicks:
-                self.trees_data[tree_newick] = [1]
-                unique_tree_newicks.add(tree_newick)
-
-            self.trees_data[tree_newick].append(tree)
             print(f'\r {round(i / self.total_trees * 100)}% complete: Trees generated {i} / {self.total_trees}', end="\r", flush=True)
             
         print(f" 100% complete: Generated all {self.total_trees} trees in network with {self.network.num_reticulations} reticulations\n")
@@ -400,16 +425,11 @@ class EmbeddedTrees:
         tree : PhylogeneticNetwork
             Tree to get the unselected leaves
         """
-        leaves = tree.leaves
-        unselected_leaves = set()
-        
-        for leaf in leaves:
-            if tree.label(leaf) not in self._selected_leaves:
-                unselected_leaves.add(leaf)
+        labels_dict = tree.labeling_dict
+        unselected_leaves = [leaf for leaf in tree.leaves if labels_dict.get(leaf) not in self._selected_leaves_set]
                 
-        #Removing any unselected leaves
-        for leaf in unselected_leaves:
-            tree.remove_node_and_reconnect(leaf)
+        #Removing any unselected leaves. Leaves have no children to reconnect so they are removed together
+        tree.remove_nodes_from(unselected_leaves)
             
         tree.clear_cache()
         tree.remove_elementary_nodes()
@@ -424,16 +444,11 @@ class EmbeddedTrees:
         tree : PhylogeneticNetwork
             Tree to get the dummy leaves
         """
-        leaves = tree.leaves
-        unlabelled_leaves = set()
-        
-        for leaf in leaves:
-            if not tree.is_labeled(leaf):
-                unlabelled_leaves.add(leaf)
+        labels_dict = tree.labeling_dict
+        unlabelled_leaves = [leaf for leaf in tree.leaves if leaf not in labels_dict]
         
         #Removing any dummy leaves that may occur when removing reticulation arcs in the network
-        for leaf in unlabelled_leaves:
-            tree.remove_node_and_reconnect(leaf)
+        tree.remove_nodes_from(unlabelled_leaves)
             
         tree.clear_cache()
         tree.remove_elementary_nodes()
@@ -445,58 +460,56 @@ class EmbeddedTrees:
         Parameters
         ----------
         close_figs : bool
-            Logic to close tree figures that are drawn (default is True). False if you want to use matplotlib's
-            figure interface instead of phyloprogram front end.
+            Logic to draw the trees on figures that aren't managed by pyplot (default is True), so no pyplot window
+            is created and closed for each figure. False if you want to use matplotlib's figure interface instead
+            of phyloprogram front end.
         """
         
         if not self.tree_figs: #If figures have not been created, draw them
+            from matplotlib.figure import Figure
+            import matplotlib.pyplot as plt
+            
             print("\nDrawing trees...")
-            tree_axes = {} #Dictionary of unique tree newicks with plot axes
             unique_plot_count = 1
             
-            unique_trees_fig = plt.figure()
+            #Figures for phyloprogram are embedded in its own canvases
+            new_figure = Figure if close_figs else plt.figure
+            
+            unique_trees_fig = new_figure()
             self.tree_figs.append(unique_trees_fig)
             
             rows = 1
             cols = 2
             
-            for i, (tree_newick, data) in enumerate(self.trees_data.items()):
+            for i, entry in enumerate(self.trees_data.values()):
                 #Draw the output trees
                 #Display rows * cols trees per figure
                 if unique_plot_count > rows * cols:
                     
                     unique_plot_count = 1
                     
-                    #Close open figures to save memory
-                    if close_figs:
-                        plt.close("all") #Comment this line if you want to show all figures through matplotlib's figure manager
-                    
                     #Create new figure
-                    unique_trees_fig = plt.figure()
+                    unique_trees_fig = new_figure()
                     
                     #Add new figure
                     self.tree_figs.append(unique_trees_fig)
                     
                 tree_ax = unique_trees_fig.add_subplot(rows, cols, unique_plot_count)
                 
-                #Store ax subplots to title later
-                tree_axes[tree_newick] = tree_ax
+                #Add number of occurences as the title above the subplot
+                tree_ax.title.set_text(entry.count)
                 
-                create_graph(data[1], unique_trees_fig.gca())
+                create_graph(entry.tree, unique_trees_fig.gca())
                 unique_plot_count += 1
                 print(f'\r {round(i / self.total_trees * 100)}% complete: Trees drawn {i} / {self.total_trees}', end="\r", flush=True)
                     
-            #Add number of occurences as the title above each subplot
-            for tree_newick in self.trees_data.keys():
-                tree_ax = tree_axes[tree_newick]
-                tree_count = self.trees_data[tree_newick][0]
-                tree_ax.title.set_text(tree_count)
-                
             self.tree_figs = tuple(self.tree_figs)
                 
             print(f" 100% complete: Drawn all {self.total_trees} trees from network with {self.network.num_reticulations} reticulations\n")
                 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    
     net_newick = "(((1, (2) #H2), ((#H2, #H3))#H1), (#H1, ((3)#H3, 4)));"
     figure = plt.figure("Network")
     network = Network(net_newick, figure, True)
@@ -2,19 +2,14 @@
 
 import sys, os
 
-def resource_path(relative_path):
+def _get_base_path():
     """
-    Get absolute path to resource, works for dev and for PyInstaller
+    Get directory that resources are stored in, works for dev and for PyInstaller
     
-    Parameters
-    ----------
-    relative_path : str
-        Relative path to file from script/executable's location
-        
     Returns
     -------
     str
-        Absolute path to file
+        Absolute path to resource directory
     """
     try:
         # PyInstaller creates a temp folder and stores path in _MEIPASS
@@ -28,7 +23,24 @@ def resource_path(relative_path):
         else:
             #When not compiled
             base_path = os.path.dirname(os.path.abspath(__file__))
-        
-    path = os.path.join(base_path, relative_path)
     
-    return path
\ No newline at end of file
+    return base_path
+
+#Resource directory does not change while program is running so only look it up once
+_BASE_PATH = _get_base_path()
+
+def resource_path(relative_path):
+    """
+    Get absolute path to resource, works for dev and for PyInstaller
+    
+    Parameters
+    ----------
+    relative_path : str
+        Relative path to file from script/executable's location
+        
+    Returns
+    -------
+    str
+        Absolute path to file
+    """
+    return os.path.join(_BASE_PATH, relative_path)
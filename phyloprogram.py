@@ -9,7 +9,7 @@ from tkinter import (Tk, Canvas, Scrollbar, Menu, Toplevel,
                      Frame, Label, Text, IntVar, Checkbutton)
 from network_processing import Network
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import sys, os, platform, webbrowser, time, path, glob, drspr as d
+import sys, os, platform, webbrowser, time, path, glob, queue, threading, drspr as d
 import matplotlib.pyplot as plt
 from widgets import HoverButton
 from phylonetwork import MalformedNewickException
@@ -17,6 +17,10 @@ from dialogs import (MultiChoicePrompt, StringInputPrompt)
 from widgets import ToolTip
 from rspr_graph import RsprGraph
 from shutil import rmtree
+from functools import lru_cache
+
+#Table for removing whitespace from newick strings
+_WHITESPACE_TABLE = str.maketrans('', '', ' \n\t\r')
 
 def deleteOldPyinstallerFolders(time_threshold = 3600): # Default setting: Remove after 1 hour, time_threshold in seconds
     try:
@@ -34,6 +38,58 @@ def deleteOldPyinstallerFolders(time_threshold = 3600): # Default setting: Remov
             
     print("Deleted temp folders from older sessions\n")
 
+def _read_text(filename):
+    """
+    For private use. Reads the whole contents of a text file and closes it afterwards.
+
+    Parameters
+    ----------
+    filename : str
+        Path to text file
+
+    Returns
+    -------
+    str
+        Contents of file
+    """
+    with open(filename, "r") as f:
+        return f.read()
+
+def _write_text(filename, text):
+    """
+    For private use. Writes text to a file in a single write and closes it afterwards.
+
+    Parameters
+    ----------
+    filename : str
+        Path to text file
+
+    text : str
+        Contents to write to file
+    """
+    with open(filename, "w") as f:
+        f.write(text)
+
+@lru_cache(maxsize=None)
+def _load_resource(name):
+    """
+    For private use. Reads a bundled text resource. Resources don't change while the program is running so
+    each one is only read from disk the first time it is needed.
+
+    Parameters
+    ----------
+    name : str
+        Filename of resource relative to program's location
+
+    Returns
+    -------
+    str
+        Contents of resource
+    """
+    path_file = path.resource_path(name)
+    print(f"\nOpened file at {path_file}\n")
+    return _read_text(path_file)
+
 class Program(Tk):
     """
     Class for application that takes a network in extended newick format and displays trees.
@@ -90,6 +146,49 @@ class Program(Tk):
             pass  
         
         
+    def _run_in_background(self, work, on_success, on_error=None):
+        """
+        For private use. Runs work in a worker thread so the window stays responsive. The result is
+        passed back through a queue which is polled from the Tk main thread, so the callbacks can
+        safely update widgets.
+        
+        Parameters
+        ----------
+        work : function
+            Function with no arguments that does the calculation. Must not use Tk or matplotlib.
+            
+        on_success : function
+            Called with the value returned by work
+            
+        on_error : function, optional
+            Called with the exception raised by work. If not given, the exception is re-raised.
+        """
+        results = queue.Queue()
+        
+        def run():
+            try:
+                results.put((True, work()))
+            except Exception as e:
+                results.put((False, e))
+                
+        def poll():
+            try:
+                success, result = results.get_nowait()
+            except queue.Empty:
+                self.after(50, poll)
+                return
+            
+            if success:
+                on_success(result)
+            elif on_error:
+                on_error(result)
+            else:
+                raise result
+            
+        threading.Thread(target=run, daemon=True).start()
+        self.after(50, poll)
+        
+        
     def _get_dpi(self):
         """
         For private use. Get the dpi of the current screen
@@ -99,10 +198,7 @@ class Program(Tk):
         int
             DPI of current monitor
         """
-        screen = Tk()
-        current_dpi = screen.winfo_fpixels("1i")
-        screen.destroy()
-        return current_dpi
+        return self.winfo_fpixels("1i")
     
     
     def _initialise_menu_bar(self):
@@ -315,10 +411,7 @@ class Program(Tk):
     def about(self):
         """Display overview of program in window"""
         self.about_window = Window(title="About")
-        path_file = path.resource_path("about.txt")
-        print(f"\nOpened file at {path_file}\n")
-        f = open(path_file, "r")
-        about_text = f.read()
+        about_text = _load_resource("about.txt")
         text_widget = Text(self.about_window)
         text_widget.insert("1.0", about_text)
         text_widget.pack(expand=True, fill="both")
@@ -328,10 +421,7 @@ class Program(Tk):
         """Display program manual in window"""
         self.manual_window = Window(title="Manual", width=self.scaled_width,
                                     height=self.scaled_height//2)
-        path_file = path.resource_path("manual.txt")
-        print(f"\nOpened file at {path_file}\n")
-        f = open(path_file, "r")
-        manual_text = f.read()
+        manual_text = _load_resource("manual.txt")
         text_widget = Text(self.manual_window, width=30)
         text_widget.insert("1.0", manual_text)
         scroll = Scrollbar(text_widget, command=text_widget.yview)
@@ -368,21 +458,26 @@ class Program(Tk):
         text_file = path[1]
             
         if filename != "":
-            f = open(filename, "r")
-            text = f.read().strip()
+            text = _read_text(filename).strip()
             
             if text != None:
-                network_newick = text[:text.find(";") + 1]
-                try:
-                    self.generate_network(network_newick, text_file)
-                except MalformedNewickException:
+                #Only the first network in the file is used
+                head, sep, _ = text.partition(";")
+                network_newick = head + sep if sep else ""
+                
+                def on_error(e):
+                    if not isinstance(e, MalformedNewickException):
+                        raise e
+                    
                     error_message = "Could not read network.\n\nNetwork requirements:\nNetwork must contain at least one labelled leaf and string must terminate with semicolon."
                     tkinter.messagebox.showerror(title="Open network error", message=error_message)
+                    
+                self.generate_network(network_newick, text_file, on_error=on_error)
         
         
-    def generate_network(self, net_newick, filename=""):
+    def generate_network(self, net_newick, filename="", on_success=None, on_error=None):
         """
-        Generate the network object and display it depending on graphics mode
+        Generate the network object in the background and display it depending on graphics mode
         
         Parameters
         ----------
@@ -391,23 +486,37 @@ class Program(Tk):
             
         filename : str, optional
             Filename of network opened (default="")
+            
+        on_success : function, optional
+            Called with no arguments once the network is displayed
+            
+        on_error : function, optional
+            Called with the exception raised if the network couldn't be generated
         """
-        self.network = Network(net_newick, self.net_fig, self.graphics)
-        self._update_info_bar(filename)
+        graphics = self.graphics
         
-        self.net_newick = net_newick
-        self._disable_save()
+        def display(network):
+            self.network = network
+            self._update_info_bar(filename)
+            
+            self.net_newick = net_newick
+            self._disable_save()
+            
+            if self.graphics:
+                self._enable_tree_tools()
+                self.main_text_widget.pack_forget()
+                self.net_canvas.get_tk_widget().pack(side="top", fill="both", expand=1)
+                self.display_network()
+            else:
+                self._enable_select_leaves()
+                self.net_canvas.get_tk_widget().pack_forget()
+                self.main_text_widget.pack(expand=True, fill="both")
+                self.print_network()
+            
+            if on_success:
+                on_success()
         
-        if self.graphics:
-            self._enable_tree_tools()
-            self.main_text_widget.pack_forget()
-            self.net_canvas.get_tk_widget().pack(side="top", fill="both", expand=1)
-            self.display_network()
-        else:
-            self._enable_select_leaves()
-            self.net_canvas.get_tk_widget().pack_forget()
-            self.main_text_widget.pack(expand=True, fill="both")
-            self.print_network()
+        self._run_in_background(lambda: Network(net_newick, self.net_fig, graphics), display, on_error)
             
             
     def print_network(self):
@@ -433,7 +542,7 @@ class Program(Tk):
         
         try:
             self.network.draw()
-            self.net_canvas.draw()
+            self.net_canvas.draw_idle()
         except (ValueError, ImportError) as e:
             if self.net_fig:
                 self.net_fig.clear()
@@ -456,15 +565,53 @@ class Program(Tk):
             self.main_text_widget.config(state="disabled")
         
         
-    def generate_trees_graph(self):
-        """Generate the tree/graph object and display them depending on graphics mode."""
+    def generate_trees_graph(self, on_success=None):
+        """
+        Generate the tree/graph object and display them depending on graphics mode. Trees embedded in a network are
+        generated in the background so the window stays responsive.
+        
+        Parameters
+        ----------
+        on_success : function, optional
+            Called with no arguments once the trees have been generated
+        """
         #Get Trees object
         if self.network:
-            self.graph_trees = self.network.process()
+            #Prevent trees being generated again until processing finished
+            button_states = (self.select_leaves_button["state"], self.draw_button["state"])
+            self.select_leaves_button.config(state="disabled")
+            self.draw_button.config(state="disabled")
             
-            if not self.graphics:
-                self.print_trees()
+            def restore_buttons():
+                self.select_leaves_button.config(state=button_states[0])
+                self.draw_button.config(state=button_states[1])
+            
+            def display(graph_trees):
+                restore_buttons()
+                self.graph_trees = graph_trees
+                
+                if not self.graphics:
+                    self.print_trees()
+                    
+                self._draw_trees_graph()
                 
+                if on_success:
+                    on_success()
+                    
+            def on_error(e):
+                restore_buttons()
+                raise e
+            
+            self._run_in_background(self.network.process, display, on_error)
+            
+        else:
+            self._draw_trees_graph()
+            
+            if on_success:
+                on_success()
+                
+    def _draw_trees_graph(self):
+        """For private use. Draw the current tree/graph object if graphics are enabled."""
         if self.graphics:
             try:
                 self.graph_trees.draw()
@@ -551,21 +698,23 @@ class Program(Tk):
         text_file = path[1]
             
         if filename != "":
-            f = open(filename, "r")
-            text = f.read().strip()
+            text = _read_text(filename).strip()
             
             if text != None and self.operation == "Calculate drSPR":
-                try:
-                    self.get_drspr(text, text_file)
-                except MalformedNewickException:
+                def on_error(e):
+                    if not isinstance(e, MalformedNewickException):
+                        raise e
+                    
                     error_message = "Could not read trees.\n\nPlease enter at least 2 trees.\nTrees must contain at least one labelled leaf and trees must terminate with semicolon."
                     tkinter.messagebox.showerror(title="Open trees error", message=error_message)
+                    
+                self.get_drspr(text, text_file, on_error=on_error)
             elif text != None and self.operation == "Create rSPR graph":
                 self.get_rspr_graph(text, text_file)
                     
-    def get_rspr_graph(self, input_trees_string, filename=""):
+    def get_rspr_graph(self, input_trees_string, filename="", on_success=None, on_error=None):
         """
-        Get rspr graph
+        Get rspr graph in the background and display it
         
         Parameters
         ----------
@@ -574,37 +723,63 @@ class Program(Tk):
             
         filename : str, optional
             Filename of trees text file opened (default="")
+            
+        on_success : function, optional
+            Called with no arguments once the graph is displayed
+            
+        on_error : function, optional
+            Called with the exception raised if the graph couldn't be created
         """
         if self.graph_window:
             self.graph_window.withdraw()
             
         self.network = None
         
-        self.graph_trees = RsprGraph(input_trees_string)
+        def work():
+            graph = RsprGraph(input_trees_string)
+            return (graph, graph.text)
         
-        self.net_canvas.get_tk_widget().pack_forget()
-        self.main_text_widget.pack(expand=True, fill="both")
-        self._update_info_bar(filename)
-        self.print_rspr_graph()
-        self._enable_text_save()
+        def display(result):
+            (self.graph_trees, text) = result
+            
+            self.net_canvas.get_tk_widget().pack_forget()
+            self.main_text_widget.pack(expand=True, fill="both")
+            self._update_info_bar(filename)
+            self.print_rspr_graph(text)
+            self._enable_text_save()
+            
+            if self.graphics:
+                self._enable_tree_display()     
+            else:
+                self._disable_tree_tools()
+                
+            if on_success:
+                on_success()
         
-        if self.graphics:
-            self._enable_tree_display()     
-        else:
-            self._disable_tree_tools()
+        self._run_in_background(work, display, on_error)
+            
+    def print_rspr_graph(self, text=None):
+        """
+        Print all trees and adjacency list
+        
+        Parameters
+        ----------
+        text : str, optional
+            Text of rspr graph if already generated
+        """
+        if text is None:
+            text = self.graph_trees.text
             
-    def print_rspr_graph(self):
-        """Print all trees and adjacency list"""
         self.main_text_widget.config(state="normal")
         self.main_text_widget.delete('1.0', "end")
         
-        self.main_text_widget.insert("end", self.graph_trees.text)
+        self.main_text_widget.insert("end", text)
         self.main_text_widget.config(state="disabled")
         
             
-    def get_drspr(self, input_trees, filename=""):
+    def get_drspr(self, input_trees, filename="", on_success=None, on_error=None):
         """
-        Get the rspr distance
+        Get the rspr distance in the background and display it
         
         Parameters
         ----------
@@ -613,29 +788,38 @@ class Program(Tk):
             
         filename : str, optional
             Filename of trees text file opened (default="")
+            
+        on_success : function, optional
+            Called with no arguments once the distances are displayed
+            
+        on_error : function, optional
+            Called with the exception raised if the distances couldn't be calculated
         """
         if self.graph_window:
             self.graph_window.withdraw()
             
         self.network = None
-        input_trees = input_trees.translate(str.maketrans('', '', ' \n\t\r'))
-        trees_array = input_trees.split(";")
-        
-        if not trees_array[-1]:
-            trees_array.pop()
-        
-        (distances, clusters, self.graph_trees) = d.calculate_drspr(trees_array)
-        
-        self.net_canvas.get_tk_widget().pack_forget()
-        self.main_text_widget.pack(expand=True, fill="both")
-        self._update_info_bar(filename)
-        self.print_drspr(self.graph_trees.trees, distances, clusters)
-        self._enable_text_save()
+        input_trees = input_trees.translate(_WHITESPACE_TABLE)
+        trees_array = input_trees.rstrip(";").split(";")
+            
+        def display(result):
+            (distances, clusters, self.graph_trees) = result
+            
+            self.net_canvas.get_tk_widget().pack_forget()
+            self.main_text_widget.pack(expand=True, fill="both")
+            self._update_info_bar(filename)
+            self.print_drspr(self.graph_trees.trees, distances, clusters)
+            self._enable_text_save()
+            
+            if self.graphics:
+                self._enable_tree_display()  
+            else:
+                self._disable_tree_tools()
+                
+            if on_success:
+                on_success()
         
-        if self.graphics:
-            self._enable_tree_display()  
-        else:
-            self._disable_tree_tools()
+        self._run_in_background(lambda: d.calculate_drspr(trees_array), display, on_error)
             
             
     def print_drspr(self, trees_array, distances, clusters):
@@ -656,62 +840,56 @@ class Program(Tk):
         self.main_text_widget.config(state="normal")
         self.main_text_widget.delete('1.0', "end")
         
-        self.main_text_widget.insert("end", "TREES:\n")
-        text = ""
+        #Build whole output first so text widget is only updated once
+        text = ["TREES:\n"]
 
         for tree in trees_array:
             if type(tree) != str:
-                text += f"{tree.text}\n"
+                text.append(f"{tree.text}\n")
             else:
-                text += f"{tree}\n"
-        
-        self.main_text_widget.insert("end", text)
+                text.append(f"{tree}\n")
         
         length = len(distances)
 
         if length == 1:
-            self.main_text_widget.insert("end", f"\ndrSPR = {distances[0]}\n")
-            self.main_text_widget.insert("end", f"Clusters: {clusters[0]}\n")
+            text.append(f"\ndrSPR = {distances[0]}\n")
+            text.append(f"Clusters: {clusters[0]}\n")
             
         else:
         
             #Printing matrix
-            self.main_text_widget.insert("end", "\nDISTANCE MATRIX:\n")
+            text.append("\nDISTANCE MATRIX:\n")
             for i in range(length):
-                self.main_text_widget.insert("end", f"{', '.join(distances[i])}\n")
+                text.append(f"{', '.join(distances[i])}\n")
                
             #Printing cluster
-            self.main_text_widget.insert("end", "\n\nCLUSTERS:")
+            text.append("\n\nCLUSTERS:")
             for i in range(length-1):
-                self.main_text_widget.insert("end", f"\nClusters compared with t{i+1}:\n")
+                text.append(f"\nClusters compared with t{i+1}:\n")
                 for j in range(i+1, len(clusters[i])):
-                    self.main_text_widget.insert("end",
-                        f"t{j+1} (drSPR = {distances[i][j]}): {' '.join(clusters[i][j])}\n")
+                    text.append(f"t{j+1} (drSPR = {distances[i][j]}): {' '.join(clusters[i][j])}\n")
         
+        self.main_text_widget.insert("end", "".join(text))
         self.main_text_widget.config(state="disabled")
         
     def save_trees_only_text(self, *_):
         """Saves just the tree newick strings in text file"""
         if self.text_save_enabled and self.network:
-            file_contents = ""
-            
-            for tree in self.graph_trees.data.keys():
-                file_contents += f"{tree}\n"
+            file_contents = "".join(f"{tree}\n" for tree in self.graph_trees.data.keys())
             
             title = "Saving trees as text file"
             
-            f =  tkinter.filedialog.asksaveasfile(initialdir = self.save_directory, title = title, 
+            filename =  tkinter.filedialog.asksaveasfilename(initialdir = self.save_directory, title = title, 
                                           filetypes = [("Text file","*.txt")], 
                                           defaultextension = [("Text file", "*.txt")])
             
-            if f: #if dialog not closed with "cancel".
+            if filename: #if dialog not closed with "cancel".
                 print("\nSaving trees only in text file...")
-                path = os.path.split(f.name)
+                path = os.path.split(filename)
                 self.save_directory = path[0]
                 
-                f.write(file_contents)
-                f.close()
-                print(f" Text file saved at {f.name}\n")
+                _write_text(filename, file_contents)
+                print(f" Text file saved at {filename}\n")
             
             
     def save_text(self, *_):
@@ -725,19 +903,18 @@ class Program(Tk):
                 file_contents = self.main_text_widget.get("1.0","end")
                 title = "Saving trees and other info as text file"
             
-            f =  tkinter.filedialog.asksaveasfile(initialdir = self.save_directory, title = title, 
+            filename =  tkinter.filedialog.asksaveasfilename(initialdir = self.save_directory, title = title, 
                                           filetypes = [("Text file","*.txt")], 
                                           defaultextension = [("Text file", "*.txt")])
             
-            if f: #if dialog not closed with "cancel".
+            if filename: #if dialog not closed with "cancel".
                 print("\nSaving as text file...")
                 
-                path = os.path.split(f.name)
+                path = os.path.split(filename)
                 self.save_directory = path[0]
                 
-                f.write(file_contents)
-                f.close()
-                print(f" Text file saved. at {f.name}\n")
+                _write_text(filename, file_contents)
+                print(f" Text file saved. at {filename}\n")
         
         
     def save_image(self, *_):
@@ -11,6 +11,9 @@ import networkx as nx
 import matplotlib.pyplot as plt
 from phylonetwork import MalformedNewickException, PhylogeneticNetwork
 import path
+
+#Table for removing whitespace from newick strings
+_WHITESPACE_TABLE = str.maketrans('', '', ' \n\t\r')
     
 class RsprGraph:
     """Class for creating rspr graph"""
@@ -38,11 +41,8 @@ class RsprGraph:
             String of all tree newick strings, each terminated by semicolon.
         """
         print("\nChecking Newick trees...")
-        input_trees = trees_string.translate(str.maketrans('', '', ' \n\t\r'))
-        trees_array = input_trees.split(";")
-        
-        if not trees_array[-1]:
-            trees_array.pop()
+        input_trees = trees_string.translate(_WHITESPACE_TABLE)
+        trees_array = input_trees.rstrip(";").split(";")
         
         self.tree_label_dict = {}
         self.valid_trees = []
@@ -110,26 +110,28 @@ class RsprGraph:
         """Gets neighbours of a single tree"""
         trees_string = "\n".join(self.valid_trees)
         
-        if platform.system() == "Windows":
-            file = path.resource_path("spr_dense_graph.exe")
-            executable = Popen(executable=file, args="", stdin=PIPE,
-                                   stdout=PIPE, stderr=PIPE,
-                                   universal_newlines=True, shell=True)
-            
-            out, err = executable.communicate(input=trees_string) 
-            
-            executable.wait()
-            executable.kill()
-            
-        else:
-            file = path.resource_path("spr_dense_graph")
-            file = file.replace(" ", "\ ")
-            executable = subprocess.run(file, stdout=PIPE, stderr=PIPE,
-                                        input=trees_string.encode("utf-8"),
-                                        shell=True)
-            
-            out = executable.stdout.decode("utf-8")
-            err = executable.stderr.decode("utf-8")
+        is_windows = platform.system() == "Windows"
+        file = path.resource_path("spr_dense_graph.exe" if is_windows else "spr_dense_graph")
+        
+        try:
+            if is_windows:
+                #communicate waits for spr_dense_graph to exit, the context manager closes the pipes
+                with Popen([file], stdin=PIPE, stdout=PIPE, stderr=PIPE,
+                           universal_newlines=True) as executable:
+                    out, err = executable.communicate(input=trees_string) 
+                
+            else:
+                executable = subprocess.run([file], stdout=PIPE, stderr=PIPE,
+                                            input=trees_string.encode("utf-8"),
+                                            check=False)
+                
+                out = executable.stdout.decode("utf-8")
+                err = executable.stderr.decode("utf-8")
+                
+        except OSError as e:
+            #Executable could not be run
+            out = ""
+            err = str(e)
         
         out = out.strip()
         
@@ -145,6 +147,7 @@ class RsprGraph:
         
         print("\nCreating adjacency list")
         total_lines = len(output_lines)
+        print_every = max(1, total_lines // 100) #Update progress at most once per percent
         for i, line in enumerate(output_lines):
             
             array = line.split(",")
@@ -163,7 +166,8 @@ class RsprGraph:
             else:
                 self.adjacency_dict[node] = [neighbour]
             
-            print(f'\r {round(i / total_lines * 100)}% complete: Processed {i} / {total_lines} lines', end="\r", flush=True)
+            if i % print_every == 0:
+                print(f'\r {round(i / total_lines * 100)}% complete: Processed {i} / {total_lines} lines', end="\r", flush=True)
             
         print(" 100% complete: rSPR graph adjacency list complete")
         
@@ -0,0 +1,48 @@
+"""
+Tests for parsing the output of a batched rspr run
+"""
+
+from drspr import parse_rspr_output, RSPR_ERROR
+
+#Output of rspr given two pairs of trees on stdin
+RSPR_OUTPUT = """T1: ((((1,2),(3,4)),((5,6),(7,8))),(((9,10),(11,12)),((13,14),(15,16))));
+T2: (((7,8),((1,(2,(14,5))),(3,4))),(((11,(6,12)),10),((13,(15,16)),9)));
+
+approx drSPR=12
+
+4
+F1: ((((1,2),(3,4)),((7,8))),(((10),(11)),((13),(15,16)))) 14 5 6 12 9
+F2: (((7,8),((1,2),(3,4))),((11,10),(13,(15,16)))) 14 5 6 12 9
+total exact drSPR=5
+
+T1: (((1,2),3),4);
+T2: (((1,3),2),4);
+
+approx drSPR=1
+
+1
+F1: ((1,3),4) 2
+F2: ((1,3),4) 2
+total exact drSPR=1
+
+"""
+
+
+def test_parse_pairs_in_order():
+    results = parse_rspr_output(RSPR_OUTPUT, 2)
+    
+    assert results == [("5", ["14", "5", "6", "12", "9"]),
+                       ("1", ["2"])]
+
+
+def test_missing_output_gives_error():
+    #rspr stopped after the first pair
+    first_pair = RSPR_OUTPUT[:RSPR_OUTPUT.index("T1: (((1,2),3),4);")]
+    results = parse_rspr_output(first_pair, 2)
+    
+    assert results[0] == ("5", ["14", "5", "6", "12", "9"])
+    assert results[1] == RSPR_ERROR
+    
+    
+def test_no_output_gives_error():
+    assert parse_rspr_output("", 1) == [RSPR_ERROR]